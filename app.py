@@ -18,6 +18,56 @@ from trade_analyzer import StockTradeAnalyzer
 
 analyzer = StockTradeAnalyzer()
 
+
+# --- 快取（Streamlit 每次互動都會重跑整支程式） ---
+
+def _hash_df(d: pd.DataFrame) -> bytes:
+    # hash_pandas_object 只看資料列，欄名另外加入（CSV 表頭不同時不可共用快取）
+    return pd.util.hash_pandas_object(d, index=True).values.tobytes() + repr(list(d.columns)).encode()
+
+
+_DF_HASH_FUNCS = {pd.DataFrame: _hash_df}
+
+
+@st.cache_data(show_spinner=False)
+def load_and_process(file_bytes: bytes) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    以上傳檔案內容為快取鍵，回傳 (原始資料, 彙整資料)
+    """
+    df2 = analyzer.csv2df(file_bytes)
+    df_raw = analyzer.df2clean(df2)
+    df = analyzer.df2calculate(df_raw)
+    return df_raw, df
+
+
+@st.cache_data(show_spinner=False, hash_funcs=_DF_HASH_FUNCS)
+def build_top20(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    回傳 (買超前20名, 賣超前20名, 當沖前20名)
+    """
+    return analyzer.top20_buy(df), analyzer.top20_sell(df), analyzer.top20_intraday(df)
+
+
+@st.cache_data(show_spinner=False, hash_funcs=_DF_HASH_FUNCS)
+def df_to_csv_bytes(df: pd.DataFrame) -> bytes:
+    return analyzer.to_utf8_sig_csv(df)
+
+
+@st.cache_data(show_spinner=False, hash_funcs=_DF_HASH_FUNCS)
+def table_png_bytes(df: pd.DataFrame, title: str, date: str) -> bytes:
+    return analyzer.df_to_png_bytes(df, title, date).getvalue()
+
+
+@st.cache_data(show_spinner=False, hash_funcs=_DF_HASH_FUNCS)
+def visualization_png_bytes(df_buy: pd.DataFrame, df_sell: pd.DataFrame, date: str) -> bytes:
+    fig = analyzer.create_visualization(df_buy, df_sell, date)
+
+    # 將圖形儲存為 PNG（預覽與下載共用同一份 150 dpi 圖檔）
+    buf = analyzer.fig_to_png_bytes(fig, dpi=150)
+    plt.close(fig)
+    return buf.getvalue()
+
+
 # --- Streamlit 主程式 ---
 
 # 🔵 CSS 調小字體
@@ -48,9 +98,8 @@ st.caption(f"📅 目前報表日期為：{date_str}")
 # --- 上傳CSV ---
 uploaded_file = st.file_uploader("上傳CSV檔案", type=["csv"])
 if uploaded_file is not None:
-    df2 = analyzer.csv2df(uploaded_file)
-    df_raw = analyzer.df2clean(df2)
-    df = analyzer.df2calculate(df_raw)
+    file_bytes = uploaded_file.getvalue()
+    df_raw, df = load_and_process(file_bytes)
     
     if df is not None:
         st.success("檔案已整理完成！")
@@ -93,19 +142,23 @@ if uploaded_file is not None:
         )
 
         # 🔵 原始資料篩選（用 df_raw）
-        df_raw_filtered = df_raw[
-            (df_raw['價格'] >= price_min_raw) & 
-            (df_raw['價格'] <= price_max_raw)
-        ]
-        if selected_brokers_raw:
-            df_raw_filtered = df_raw_filtered[df_raw_filtered['券商'].isin(selected_brokers_raw)]
+        # 未縮小範圍且未選券商時直接沿用 df_raw，不複製
+        if price_min_raw <= min_price_raw and price_max_raw >= max_price_raw and not selected_brokers_raw:
+            df_raw_filtered = df_raw
+        else:
+            prices_raw = df_raw['價格'].values
+            mask_raw = (prices_raw >= price_min_raw) & (prices_raw <= price_max_raw)
+            if selected_brokers_raw:
+                selected_codes = df_raw['券商'].cat.categories.get_indexer(selected_brokers_raw)
+                mask_raw &= df_raw['券商'].cat.codes.isin(selected_codes).values
+            df_raw_filtered = df_raw.iloc[mask_raw.nonzero()[0]]
 
         # --- 顯示原始資料 ---
         st.subheader("原始資料")
         st.dataframe(df_raw_filtered, use_container_width=True)
 
         # CSV 下載按鈕（原本的）
-        csv_raw_filtered = df_raw_filtered.to_csv(index=False).encode('utf-8-sig')
+        csv_raw_filtered = df_to_csv_bytes(df_raw_filtered)
         st.download_button(
             label="下載原始資料 CSV",
             data=csv_raw_filtered,
@@ -150,18 +203,22 @@ if uploaded_file is not None:
             key="brokers_agg"
         )
 
-        df_filtered = df[
-            (df['買入價'] >= price_min_agg) & 
-            (df['買入價'] <= price_max_agg)
-        ]
-        if selected_brokers_agg:
-            df_filtered = df_filtered[df_filtered['券商'].isin(selected_brokers_agg)]
+        # 未縮小範圍且未選券商時直接沿用 df，不複製
+        if price_min_agg <= min_price_agg and price_max_agg >= max_price_agg and not selected_brokers_agg:
+            df_filtered = df
+        else:
+            prices_agg = df['買入價'].values
+            mask_agg = (prices_agg >= price_min_agg) & (prices_agg <= price_max_agg)
+            if selected_brokers_agg:
+                selected_codes = df['券商'].cat.categories.get_indexer(selected_brokers_agg)
+                mask_agg &= df['券商'].cat.codes.isin(selected_codes).values
+            df_filtered = df.iloc[mask_agg.nonzero()[0]]
 
         st.subheader("彙整資料")
         st.dataframe(df_filtered, use_container_width=True)
         
         # CSV 下載按鈕（原本的）
-        csv_filtered = df_filtered.to_csv(index=False).encode('utf-8-sig')
+        csv_filtered = df_to_csv_bytes(df_filtered)
         st.download_button(
             label="下載彙整資料 CSV",
             data=csv_filtered,
@@ -174,10 +231,10 @@ if uploaded_file is not None:
 
 
         # --- Top20 報表 + 下載 ---
+        df_buy, df_sell, df_intraday = build_top20(df)
 
         ## 📈 買超前20名
         st.subheader("📈 買超前20名")
-        df_buy = analyzer.top20_buy(df)  # 這裡是你原本的邏輯
         st.table(df_buy.style.format({
             "買入價": "{:.1f}",
             "賣出價": "{:.1f}",
@@ -187,7 +244,7 @@ if uploaded_file is not None:
         }))
 
         # CSV 下載
-        csv_buy = df_buy.to_csv(index=False).encode('utf-8-sig')
+        csv_buy = df_to_csv_bytes(df_buy)
         st.download_button(
             label="下載買超前20名 CSV",
             data=csv_buy,
@@ -196,7 +253,7 @@ if uploaded_file is not None:
         )
 
         # PNG 下載
-        png_buf_buy = analyzer.df_to_png_bytes(df_buy, "買超前20名", date_str)
+        png_buf_buy = table_png_bytes(df_buy, "買超前20名", date_str)
         st.download_button(
             label="下載買超前20名 PNG",
             data=png_buf_buy,
@@ -209,7 +266,6 @@ if uploaded_file is not None:
 
         ## 📉 賣超前20名
         st.subheader("📉 賣超前20名")
-        df_sell = analyzer.top20_sell(df)  # 這裡是你原本的邏輯
         st.table(df_sell.style.format({
             "買入價": "{:.1f}",
             "賣出價": "{:.1f}",
@@ -219,7 +275,7 @@ if uploaded_file is not None:
         }))
 
         # CSV 下載
-        csv_sell = df_sell.to_csv(index=False).encode('utf-8-sig')
+        csv_sell = df_to_csv_bytes(df_sell)
         st.download_button(
             label="下載賣超前20名 CSV",
             data=csv_sell,
@@ -228,7 +284,7 @@ if uploaded_file is not None:
         )
 
         # PNG 下載
-        png_buf_sell = analyzer.df_to_png_bytes(df_sell, "賣超前20名", date_str)
+        png_buf_sell = table_png_bytes(df_sell, "賣超前20名", date_str)
         st.download_button(
             label="下載賣超前20名 PNG",
             data=png_buf_sell,
@@ -241,7 +297,6 @@ if uploaded_file is not None:
 
         ## ⚡ 當沖前20名
         st.subheader("⚡ 當沖前20名")
-        df_intraday = analyzer.top20_intraday(df)  # 這裡是你原本的邏輯
         st.table(df_intraday.style.format({
             "買入(張)": "{:.0f}",
             "賣出(張)": "{:.0f}",
@@ -252,7 +307,7 @@ if uploaded_file is not None:
         }))
 
         # CSV 下載
-        csv_intraday = df_intraday.to_csv(index=False).encode('utf-8-sig')
+        csv_intraday = df_to_csv_bytes(df_intraday)
         st.download_button(
             label="下載當沖前20名 CSV",
             data=csv_intraday,
@@ -261,7 +316,7 @@ if uploaded_file is not None:
         )
 
         # PNG 下載
-        png_buf_intraday = analyzer.df_to_png_bytes(df_intraday, "當沖前20名", date_str)
+        png_buf_intraday = table_png_bytes(df_intraday, "當沖前20名", date_str)
         st.download_button(
             label="下載當沖前20名 PNG",
             data=png_buf_intraday,
@@ -275,12 +330,7 @@ if uploaded_file is not None:
         ## 圖片
 
         st.subheader("🚀 買賣超對照圖")
-        fig = analyzer.create_visualization(df_buy, df_sell, date_str)
-
-        # 將圖形儲存到 BytesIO
-        buf = io.BytesIO()
-        fig.savefig(buf, format='png', dpi=300, bbox_inches='tight', facecolor=fig.get_facecolor())
-        buf.seek(0)
+        buf = visualization_png_bytes(df_buy, df_sell, date_str)
 
         # 顯示圖片
         st.image(buf, caption="📷 買賣超對照圖", use_container_width=True)
@@ -1,15 +1,46 @@
 # trade_analyzer.py
 from __future__ import annotations
 
+import functools
 import io
-import csv
+import re
 from pathlib import Path
 from typing import Tuple, Optional
 
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 import matplotlib.pyplot as plt
 import matplotlib.font_manager as fm
+from PIL import Image, ImageDraw, ImageFont
+
+# PNG 編碼參數：表格/長條圖多為大片純色，低壓縮等級即可，編碼快得多
+PNG_PIL_KWARGS = {"compress_level": 3, "optimize": False}
+
+# 券商名稱只保留中日韓文字、全形符號與 ()-
+_KEEP_RE = re.compile(r"[^\u4e00-\u9fff\u3000-\u303f\uff00-\uffef()\-]")
+
+
+@functools.lru_cache(maxsize=None)
+def _image_font(font_path: str, size: int) -> ImageFont.FreeTypeFont:
+    """
+    df_to_png_bytes 用的 Pillow 字型（同一路徑與字級只載入一次）
+    """
+    return ImageFont.truetype(font_path, size)
+
+
+@functools.lru_cache(maxsize=None)
+def _font_properties(font_path: str) -> Optional[fm.FontProperties]:
+    """
+    create_visualization 用的 matplotlib 字型（同一路徑只解析一次並註冊到 fontManager）
+    """
+    fp = Path(font_path)
+    if not fp.exists():
+        print("❌ 找不到字型檔案：", font_path)
+        return None
+    fm.fontManager.addfont(str(fp))
+    return fm.FontProperties(fname=str(fp))
 
 
 class StockTradeAnalyzer:
@@ -17,30 +48,36 @@ class StockTradeAnalyzer:
     整合：CSV 解析、清整、彙總計算、Top20 報表、PNG 輸出、視覺化
     """
 
+    # df2calculate 輸出中以 float32 儲存的欄位
+    _FLOAT32_COLS = [
+        "買入(張)", "買入價", "賣出(張)", "賣出價", "當沖量(張)",
+        "總買進金額(萬)", "總賣出金額(萬)", "淨買入(張)", "淨賣出(張)", "當沖盈虧(萬)",
+    ]
+
     # ====== 讀檔與清整 ======
 
     def csv2df(
         self,
-        uploaded_file,
+        file_bytes: bytes,
         encoding: str = "big5",
         header_row: int = 2,
         data_start_row: int = 3,
     ) -> Optional[pd.DataFrame]:
         """
         讀取原始 CSV（證交所分點日報），將第 header_row 行當標題，其後為資料列。
+        file_bytes 為上傳檔案的原始位元組，由 pandas C parser 直接解碼。
         """
         try:
-            content = uploaded_file.read().decode(encoding)
-            sio = io.StringIO(content)
-
-            reader = csv.reader(sio)
-            rows = [row for row in reader]
-            if not rows:
-                return None
-
-            header = rows[header_row]
-            data = rows[data_start_row:]
-            df = pd.DataFrame(data, columns=header)
+            df = pd.read_csv(
+                io.BytesIO(file_bytes),
+                encoding=encoding,
+                header=header_row,
+                skiprows=range(header_row + 1, data_start_row),
+                skip_blank_lines=False,
+                keep_default_na=False,
+                dtype=str,
+                engine="c",
+            )
             return df
         except Exception as e:
             print(f"讀取檔案失敗: {e}")
@@ -50,118 +87,119 @@ class StockTradeAnalyzer:
         """
         將左右兩區資料欄位整併為統一欄位：券商、價格、買進股數、賣出股數
         """
-        left_df = df.iloc[:, [1, 2, 3, 4]].copy()
-        left_df.columns = ["券商", "價格", "買進股數", "賣出股數"]
-        right_df = df.iloc[:, [7, 8, 9, 10]].copy()
-        right_df.columns = ["券商", "價格", "買進股數", "賣出股數"]
-
-        combined_df = pd.concat([left_df, right_df], ignore_index=True)
-        combined_df["價格"] = pd.to_numeric(combined_df["價格"], errors="coerce")
-        combined_df["買進股數"] = (
-            pd.to_numeric(combined_df["買進股數"], errors="coerce").fillna(0).astype(int)
+        left = df.iloc[:, 1:5].to_numpy()
+        right = df.iloc[:, 7:11].to_numpy()
+        combined_df = pd.DataFrame(
+            np.vstack([left, right]), columns=["券商", "價格", "買進股數", "賣出股數"]
         )
-        combined_df["賣出股數"] = (
-            pd.to_numeric(combined_df["賣出股數"], errors="coerce").fillna(0).astype(int)
+
+        num_cols = ["價格", "買進股數", "賣出股數"]
+        combined_df[num_cols] = combined_df[num_cols].apply(pd.to_numeric, errors="coerce")
+        combined_df = combined_df.fillna({"買進股數": 0, "賣出股數": 0}).astype(
+            {"買進股數": "int32", "賣出股數": "int32"}
         )
 
-        return combined_df.dropna()
+        # 券商：類別欄位（分組/篩選用整數 codes），類別名稱以 Arrow 字串連續儲存
+        return combined_df.dropna().astype({"券商": "string[pyarrow]"}).astype({"券商": "category"})
 
     def df2calculate(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         以券商為單位計算買入/賣出均價、總額、淨買賣、當沖量與當沖盈虧等。
         """
-        results = {}
+        # 券商依首次出現順序編號，各項總和以 bincount 按編號一次累加
+        codes, brokers = pd.factorize(df["券商"], sort=False)
+        n_brokers = len(brokers)
+        prices = df["價格"].to_numpy(dtype=np.float64)
+        buy_shares = df["買進股數"].to_numpy(dtype=np.int64)
+        sell_shares = df["賣出股數"].to_numpy(dtype=np.int64)
+
+        total_buy_shares = np.bincount(codes, weights=buy_shares, minlength=n_brokers).astype(np.int64)
+        total_sell_shares = np.bincount(codes, weights=sell_shares, minlength=n_brokers).astype(np.int64)
+        total_buy_amount = np.bincount(codes, weights=prices * buy_shares, minlength=n_brokers)
+        total_sell_amount = np.bincount(codes, weights=prices * sell_shares, minlength=n_brokers)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            avg_buy_price = np.where(
+                total_buy_shares > 0, np.round(total_buy_amount / total_buy_shares, 2), 0.0
+            )
+            avg_sell_price = np.where(
+                total_sell_shares > 0, np.round(total_sell_amount / total_sell_shares, 2), 0.0
+            )
+
+        # Day trade
+        day_trade_volume = np.minimum(total_buy_shares, total_sell_shares)
+        profit_loss = np.where(day_trade_volume > 0, (avg_sell_price - avg_buy_price) * 1000, 0.0)
+
+        # Net
+        net_shares = total_buy_shares - total_sell_shares
+        net_buy_amount = np.where(net_shares > 0, net_shares * avg_buy_price / 10000, 0.0)
+        net_sell_amount = np.where(net_shares < 0, -net_shares * avg_sell_price / 10000, 0.0)
+
+        result_df = pd.DataFrame({
+            "券商": brokers,
+            "買入(張)": total_buy_shares / 1000,
+            "買入價": avg_buy_price,
+            "賣出(張)": total_sell_shares / 1000,
+            "賣出價": avg_sell_price,
+            "當沖量(張)": day_trade_volume / 1000,
+            "總買進金額(萬)": total_buy_amount / 10000,
+            "總賣出金額(萬)": total_sell_amount / 10000,
+            "淨買入(張)": np.where(net_shares > 0, net_shares / 1000, 0.0),
+            "淨賣出(張)": np.where(net_shares < 0, -net_shares / 1000, 0.0),
+            "淨買額(萬)": np.trunc(np.round(net_buy_amount, 1)).astype(int),
+            "淨賣額(萬)": np.trunc(np.round(net_sell_amount, 1)).astype(int),
+            "當沖盈虧(萬)": profit_loss * day_trade_volume / (10000 * 1000),
+        })
+        return result_df.round(1).astype({
+            "券商": "category",
+            **{col: "float32" for col in self._FLOAT32_COLS},
+            "淨買額(萬)": "int32",
+            "淨賣額(萬)": "int32",
+        })
 
-        for broker in df["券商"].unique():
-            broker_data = df[df["券商"] == broker]
+    # ====== Top20 報表 ======
 
-            # Buy
-            buy_data = broker_data[broker_data["買進股數"] > 0]
-            total_buy_shares = int(buy_data["買進股數"].sum()) if not buy_data.empty else 0
-            if total_buy_shares > 0:
-                total_buy_amount = float((buy_data["價格"] * buy_data["買進股數"]).sum())
-                avg_buy_price = round(total_buy_amount / total_buy_shares, 2)
-            else:
-                total_buy_amount = 0.0
-                avg_buy_price = 0.0
-
-            # Sell
-            sell_data = broker_data[broker_data["賣出股數"] > 0]
-            total_sell_shares = int(sell_data["賣出股數"].sum()) if not sell_data.empty else 0
-            if total_sell_shares > 0:
-                total_sell_amount = float((sell_data["價格"] * sell_data["賣出股數"]).sum())
-                avg_sell_price = round(total_sell_amount / total_sell_shares, 2)
-            else:
-                total_sell_amount = 0.0
-                avg_sell_price = 0.0
-
-            # Day trade
-            day_trade_volume = min(total_buy_shares, total_sell_shares)
-            profit_loss = (avg_sell_price - avg_buy_price) * 1000 if day_trade_volume else 0.0
-
-            # Net
-            net_shares = total_buy_shares - total_sell_shares
-            if net_shares > 0:
-                net_buy_amount = (net_shares * avg_buy_price) / 10000 if avg_buy_price else 0.0
-                net_sell_amount = 0.0
-            else:
-                net_buy_amount = 0.0
-                net_sell_amount = (abs(net_shares) * avg_sell_price) / 10000 if avg_sell_price else 0.0
-
-            results[broker] = {
-                "券商": broker,
-                "買入(張)": round(total_buy_shares/1000,1),
-                "買入價": round(avg_buy_price, 1),
-                "賣出(張)": round(total_sell_shares/1000,1),
-                "賣出價": round(avg_sell_price, 1),
-                "當沖量(張)": round(day_trade_volume/1000, 1),
-                "總買進金額(萬)": round(total_buy_amount/10000, 1),
-                "總賣出金額(萬)": round(total_sell_amount/10000, 1),
-                "淨買入(張)": round(net_shares/1000, 1) if net_shares > 0 else 0,
-                "淨賣出(張)": round(abs(net_shares)/1000, 1) if net_shares < 0 else 0,
-                "淨買額(萬)": int(round(net_buy_amount, 1)),
-                "淨賣額(萬)": int(round(net_sell_amount, 1)),
-                "當沖盈虧(萬)": profit_loss*day_trade_volume/(10000*1000),
-            }
-
-        result_df = pd.DataFrame.from_dict(results, orient="index").reset_index(drop=True)
-        return result_df.round(1)
+    @staticmethod
+    def _topk(
+        df: pd.DataFrame,
+        col: str,
+        cols: list,
+        n: int = 20,
+        round_cols: Tuple[str, ...] = ("買入價", "賣出價"),
+    ) -> pd.DataFrame:
+        """
+        取 col 由大到小前 n 列並只保留 cols：partition 先找出前 n 名，只對這 n 筆排序，
+        再由各欄陣列一次組成結果（index 為 1 起算的「名次」，round_cols 四捨五入至 1 位）。
+        """
+        v = df[col].to_numpy()
+        if n < len(v):
+            # 第 n 大的值為門檻；與門檻同值者依原列位置補滿 n 筆
+            kth = -np.partition(-v, n - 1)[n - 1]
+            above = np.flatnonzero(v > kth)
+            ties = np.flatnonzero(v == kth)[: n - len(above)]
+            idx = np.concatenate([above, ties])
+        else:
+            idx = np.arange(len(v))
+        # 由大到小；同值時依原列位置（首次出現者在前）
+        idx = idx[np.lexsort((idx, -v[idx]))]
 
-    # ====== Top20 報表 ======
+        data = {}
+        for c in cols:
+            values = df[c].array[idx]
+            data[c] = np.round(values, 1) if c in round_cols else values
+        return pd.DataFrame(data, index=pd.RangeIndex(1, len(idx) + 1, name="名次"))
 
     def top20_buy(self, df: pd.DataFrame, n: int = 20) -> pd.DataFrame:
-        df_buy_20 = df.sort_values(by="淨買入(張)", ascending=False).head(n)
         cols = ["券商", "買入(張)", "買入價", "賣出(張)", "賣出價", "淨買入(張)", "淨買額(萬)"]
-        out = df_buy_20[cols].reset_index(drop=True)
-        out.index = out.index + 1
-        out.index.name = "名次"
-        out["買入價"] = out["買入價"].round(1)
-        out["賣出價"] = out["賣出價"].round(1)
-        return out
+        return self._topk(df, "淨買入(張)", cols, n)
 
     def top20_sell(self, df: pd.DataFrame, n: int = 20) -> pd.DataFrame:
-        df_sell_20 = df.sort_values(by="淨賣出(張)", ascending=False).head(n)
         cols = ["券商", "買入(張)", "買入價", "賣出(張)", "賣出價", "淨賣出(張)", "淨賣額(萬)"]
-        out = df_sell_20[cols].reset_index(drop=True)
-        out.index = out.index + 1
-        out.index.name = "名次"
-        out["買入價"] = out["買入價"].round(1)
-        out["賣出價"] = out["賣出價"].round(1)
-        return out
+        return self._topk(df, "淨賣出(張)", cols, n)
 
     def top20_intraday(self, df: pd.DataFrame, n: int = 20) -> pd.DataFrame:
-        df_day_20 = df.sort_values(by="當沖量(張)", ascending=False).head(n)
         cols = ["券商", "買入(張)", "買入價", "賣出(張)", "賣出價", "當沖量(張)", "當沖盈虧(萬)"]
-        out = df_day_20[cols].reset_index(drop=True)
-        out.index = out.index + 1
-        out.index.name = "名次"
-
-        # 四捨五入處理
-        out["當沖盈虧(萬)"] = out["當沖盈虧(萬)"].round(1)
-        out["買入價"] = out["買入價"].round(1)
-        out["賣出價"] = out["賣出價"].round(1)
-
-        return out
+        return self._topk(df, "當沖量(張)", cols, n, round_cols=("買入價", "賣出價", "當沖盈虧(萬)"))
 
     # ====== 文字/數值格式工具 ======
 
@@ -192,16 +230,14 @@ class StockTradeAnalyzer:
 
     @staticmethod
     def format_broker_name(name) -> str:
-        if not isinstance(name, str):
-            return ""
-        return "".join(
-            ch
-            for ch in name
-            if ("\u4e00" <= ch <= "\u9fff")
-            or ("\u3000" <= ch <= "\u303f")
-            or ("\uff00" <= ch <= "\uffef")
-            or ch in "()-"
-        )
+        return "" if not isinstance(name, str) else _KEEP_RE.sub("", name)
+
+    @staticmethod
+    def format_broker_series(s: pd.Series) -> pd.Series:
+        """
+        format_broker_name 的整欄版本（非字串值轉為空字串）
+        """
+        return s.astype("string").str.replace(_KEEP_RE, "", regex=True).fillna("").astype(object)
 
     @classmethod
     def format_volume_int(cls, value) -> str:
@@ -232,52 +268,15 @@ class StockTradeAnalyzer:
         font_path_regular: str = "fonts/NotoSansCJKtc-Regular.otf",
     ) -> io.BytesIO:
         """
-        將 DataFrame 轉為表格風格 PNG 圖片位元流
+        將 DataFrame 轉為表格風格 PNG 圖片位元流（以 Pillow 直接繪製）
         """
         df = df.copy()
         df.insert(0, "名次", range(1, len(df) + 1))
 
-        prop = fm.FontProperties(fname=Path(font_path_regular))
-
-        def adjust_column_widths(table, df, total_width=1.0):
-            col_widths = []
-            for col in df.columns:
-                max_len = max([len(str(col))] + [len(str(v)) for v in df[col].values])
-                col_widths.append(max_len)
-            col_widths = np.array(col_widths, dtype=float)
-            col_widths = col_widths / col_widths.sum() * total_width
-            for col_idx, width in enumerate(col_widths):
-                for row_idx in range(len(df) + 1):
-                    cell = table[(row_idx, col_idx)]
-                    cell.set_width(width)
-
-        fig, ax = plt.subplots(figsize=(len(df.columns) * 1.8, len(df) * 0.48))
-        ax.axis("off")
-
-        ax.text(
-            0.01,
-            0.98,
-            title,
-            fontsize=16,
-            fontproperties=prop,
-            color="#333333",
-            ha="left",
-            va="top",
-            transform=ax.transAxes,
-        )
-        ax.text(
-            0.99,
-            0.05,
-            date,
-            fontsize=12,
-            fontproperties=prop,
-            color="#666666",
-            ha="right",
-            va="top",
-            transform=ax.transAxes,
-        )
-
-        table = ax.table(cellText=df.values, colLabels=df.columns, loc="center", cellLoc="center")
+        # 字級約等同 150 dpi 下的 10pt / 16pt / 12pt
+        font = _image_font(font_path_regular, 21)
+        title_font = _image_font(font_path_regular, 33)
+        date_font = _image_font(font_path_regular, 25)
 
         header_text_color = "#FFFFFF"
         header_bg_color = "#4A6FA5"
@@ -286,42 +285,65 @@ class StockTradeAnalyzer:
         odd_row_color = "#FFFFFF"
         edge_color = "#DDDDDD"
 
-        for (row, col), cell in table.get_celld().items():
-            cell.get_text().set_fontproperties(prop)
-            cell.get_text().set_fontsize(10)
+        header = [str(col) for col in df.columns]
+        cells = df.astype(str).to_numpy()
+
+        margin = 4
+        cell_pad_x = 24
+        row_height = 45
+        title_height = 84
+        footer_height = 84
+
+        col_widths = [
+            max([font.getlength(h)] + [font.getlength(v) for v in cells[:, j]]) + 2 * cell_pad_x
+            for j, h in enumerate(header)
+        ]
+        x_edges = margin + np.concatenate([[0], np.cumsum(np.ceil(col_widths))]).astype(int)
+        table_top = title_height
+        table_bottom = table_top + row_height * (len(df) + 1)
+
+        width = int(x_edges[-1]) + margin
+        height = table_bottom + footer_height
+        img = Image.new("RGB", (width, height), "white")
+        draw = ImageDraw.Draw(img)
+
+        draw.text((margin + 16, 20), title, font=title_font, fill="#333333")
+
+        for row in range(len(df) + 1):
+            y0 = table_top + row * row_height
             if row == 0:
-                cell.set_facecolor(header_bg_color)
-                cell.get_text().set_color(header_text_color)
-                cell.get_text().set_weight("bold")
+                fill, color, texts = header_bg_color, header_text_color, header
             else:
-                cell.get_text().set_color(text_color)
-                if row % 2 == 0:
-                    cell.set_facecolor(even_row_color)
-                else:
-                    cell.set_facecolor(odd_row_color)
-            cell.set_edgecolor(edge_color)
-
-        table.scale(1, 1.8)
-        adjust_column_widths(table, df)
+                fill = even_row_color if row % 2 == 0 else odd_row_color
+                color, texts = text_color, cells[row - 1]
+            draw.rectangle([x_edges[0], y0, x_edges[-1], y0 + row_height], fill=fill)
+            cy = y0 + row_height / 2
+            for col, text in enumerate(texts):
+                cx = (x_edges[col] + x_edges[col + 1]) / 2
+                draw.text((cx, cy), text, font=font, fill=color, anchor="mm")
+
+        for x in x_edges:
+            draw.line([(x, table_top), (x, table_bottom)], fill=edge_color)
+        for row in range(len(df) + 2):
+            y = table_top + row * row_height
+            draw.line([(x_edges[0], y), (x_edges[-1], y)], fill=edge_color)
+
+        draw.text((width - margin - 16, height - 16), date, font=date_font, fill="#666666", anchor="rb")
 
         buf = io.BytesIO()
-        plt.savefig(buf, format="png", bbox_inches="tight", dpi=150, facecolor="white", pad_inches=0.02)
+        img.save(buf, format="PNG", **PNG_PIL_KWARGS)
         buf.seek(0)
-        plt.close(fig)
         return buf
 
     # ====== 視覺化（買賣超對照圖） ======
 
     @staticmethod
     def _load_font(font_path: str) -> Optional[fm.FontProperties]:
-        fp = Path(font_path)
-        if fp.exists():
-            prop = fm.FontProperties(fname=str(fp))
+        prop = _font_properties(font_path)
+        if prop is not None:
             # 將 rcParams 的族名設為該字型，確保中文字顯示
             plt.rcParams["font.family"] = prop.get_name()
-            return prop
-        print("❌ 找不到字型檔案：", font_path)
-        return None
+        return prop
 
     @classmethod
     def create_visualization(
@@ -392,13 +414,17 @@ class StockTradeAnalyzer:
         ax.text(0.5, header_y, "買賣超張數(價)", color=header_color, fontsize=header_fontsize, fontweight=font_weight, ha="center", va="center", fontproperties=font_prop)
         ax.text(0.82, header_y, "賣超分點", color=header_color, fontsize=header_fontsize, fontweight=font_weight, ha="center", va="center", fontproperties=font_prop)
 
+        # Columns → NumPy（迴圈內不再逐格 .iloc）
+        buy_brokers = cls.format_broker_series(buy_top_raw["券商"].head(num_buy)).to_numpy()
+        buy_vols = buy_top_raw["淨買入(張)"].to_numpy()[:num_buy]
+        buy_prices = buy_top_raw["買入價"].to_numpy()[:num_buy]
+        sell_brokers = cls.format_broker_series(sell_top_raw["券商"].head(num_sell)).to_numpy()
+        sell_vols = sell_top_raw["淨賣出(張)"].to_numpy()[:num_sell]
+        sell_prices = sell_top_raw["賣出價"].to_numpy()[:num_sell]
+
         # Max scale
-        all_volumes_k = []
-        if num_buy > 0:
-            all_volumes_k.extend(abs(buy_top_raw["淨買入(張)"].head(num_buy)))
-        if num_sell > 0:
-            all_volumes_k.extend(abs(sell_top_raw["淨賣出(張)"].head(num_sell)))
-        max_abs_volume_k = max(all_volumes_k) if all_volumes_k and max(all_volumes_k) > 0 else 1.0
+        all_volumes_k = np.abs(np.concatenate([buy_vols, sell_vols]))
+        max_abs_volume_k = all_volumes_k.max() if all_volumes_k.size and all_volumes_k.max() > 0 else 1.0
 
         # Layout params
         x_buy_broker = 0.01
@@ -410,49 +436,33 @@ class StockTradeAnalyzer:
         bar_max_relative_width = 0.40
         bar_height = 0.7
 
-        # Rows
-        for i in range(max_rows):
-            y = i + 0.5
-
-            # Buy side
-            if i < num_buy:
-                broker = cls.format_broker_name(buy_top_raw["券商"].iloc[i])
-                volume_val = buy_top_raw["淨買入(張)"].iloc[i]
-                price_val = buy_top_raw["買入價"].iloc[i]
-                price_text, volume_text = cls.format_volume_with_price_label(volume_val, price_val)
-
-                volume_k = abs(volume_val)
-                bar_width = (volume_k / max_abs_volume_k) * bar_max_relative_width if max_abs_volume_k > 0 else 0
-                bar_left = center_ref - bar_width
-
-                ax.barh(y, width=bar_width, left=bar_left, height=bar_height, color=buy_color_bar, alpha=0.8, edgecolor=None)
-                ax.text(x_buy_broker, y, broker, color=broker_color, fontsize=broker_fontsize, fontweight=font_weight, ha="left", va="center", fontproperties=font_prop)
-
-                x_vol = center_ref - base_offset
-                ax.text(x_vol, y, volume_text, color=buy_volume_color, fontsize=value_fontsize, fontweight=font_weight, ha="right", va="center", fontproperties=font_prop)
-                if price_text:
-                    x_price = x_vol - fixed_gap_value
-                    ax.text(x_price, y, price_text, color=buy_price_color, fontsize=value_fontsize, fontweight=font_weight, ha="right", va="center", fontproperties=font_prop)
-
-            # Sell side
-            if i < num_sell:
-                broker = cls.format_broker_name(sell_top_raw["券商"].iloc[i])
-                volume_val = sell_top_raw["淨賣出(張)"].iloc[i]
-                price_val = sell_top_raw["賣出價"].iloc[i]
-                price_text, volume_text = cls.format_volume_with_price_label(volume_val, price_val)
-
-                volume_k = abs(volume_val)
-                bar_width = (volume_k / max_abs_volume_k) * bar_max_relative_width if max_abs_volume_k > 0 else 0
-                bar_left = center_ref
-
-                ax.barh(y, width=bar_width, left=bar_left, height=bar_height, color=sell_color_bar, alpha=0.8, edgecolor=None)
-                ax.text(x_sell_broker, y, broker, color=broker_color, fontsize=broker_fontsize, fontweight=font_weight, ha="right", va="center", fontproperties=font_prop)
-
-                x_vol = center_ref + base_offset
-                ax.text(x_vol, y, volume_text, color=sell_volume_color, fontsize=value_fontsize, fontweight=font_weight, ha="left", va="center", fontproperties=font_prop)
-                if price_text:
-                    x_price = x_vol + fixed_gap_value
-                    ax.text(x_price, y, price_text, color=sell_price_color, fontsize=value_fontsize, fontweight=font_weight, ha="left", va="center", fontproperties=font_prop)
+        # Bars（每側一次 barh）
+        buy_ys = np.arange(num_buy) + 0.5
+        sell_ys = np.arange(num_sell) + 0.5
+        buy_bar_widths = (np.abs(buy_vols) / max_abs_volume_k) * bar_max_relative_width
+        sell_bar_widths = (np.abs(sell_vols) / max_abs_volume_k) * bar_max_relative_width
+        ax.barh(buy_ys, width=buy_bar_widths, left=center_ref - buy_bar_widths, height=bar_height, color=buy_color_bar, alpha=0.8, edgecolor=None)
+        ax.barh(sell_ys, width=sell_bar_widths, left=center_ref, height=bar_height, color=sell_color_bar, alpha=0.8, edgecolor=None)
+
+        # Labels：依 (x 位置, 顏色, 字級, 對齊) 分為六組，共用同一組文字參數
+        buy_price_texts, buy_volume_texts = zip(*map(cls.format_volume_with_price_label, buy_vols, buy_prices)) if num_buy else ((), ())
+        sell_price_texts, sell_volume_texts = zip(*map(cls.format_volume_with_price_label, sell_vols, sell_prices)) if num_sell else ((), ())
+
+        x_buy_vol = center_ref - base_offset
+        x_sell_vol = center_ref + base_offset
+        label_groups = [
+            (x_buy_broker, buy_ys, buy_brokers, broker_color, broker_fontsize, "left"),
+            (x_buy_vol, buy_ys, buy_volume_texts, buy_volume_color, value_fontsize, "right"),
+            (x_buy_vol - fixed_gap_value, buy_ys, buy_price_texts, buy_price_color, value_fontsize, "right"),
+            (x_sell_broker, sell_ys, sell_brokers, broker_color, broker_fontsize, "right"),
+            (x_sell_vol, sell_ys, sell_volume_texts, sell_volume_color, value_fontsize, "left"),
+            (x_sell_vol + fixed_gap_value, sell_ys, sell_price_texts, sell_price_color, value_fontsize, "left"),
+        ]
+        text_kw = dict(fontweight=font_weight, va="center", fontproperties=font_prop)
+        for x, ys, texts, color, fontsize, ha in label_groups:
+            for y, text in zip(ys, texts):
+                if text:
+                    ax.text(x, y, text, color=color, fontsize=fontsize, ha=ha, **text_kw)
 
         # Summary
         total_buy_k = buy_top_raw["淨買入(張)"].head(num_buy).sum()  if num_buy > 0 else 0
@@ -466,9 +476,26 @@ class StockTradeAnalyzer:
 
     # ====== 其他小工具 ======
 
+    @staticmethod
+    def to_utf8_sig_csv(df: pd.DataFrame) -> bytes:
+        """
+        以 pyarrow 的 CSV writer 輸出 UTF-8（含 BOM，Excel 開啟中文不亂碼），不含 index
+        """
+        buf = io.BytesIO()
+        buf.write(b"\xef\xbb\xbf")
+        pacsv.write_csv(pa.Table.from_pandas(df, preserve_index=False), buf)
+        return buf.getvalue()
+
     @staticmethod
     def fig_to_png_bytes(fig: plt.Figure, dpi: int = 300) -> io.BytesIO:
         buf = io.BytesIO()
-        fig.savefig(buf, format="png", dpi=dpi, bbox_inches="tight", facecolor=fig.get_facecolor())
+        fig.savefig(
+            buf,
+            format="png",
+            dpi=dpi,
+            bbox_inches="tight",
+            facecolor=fig.get_facecolor(),
+            pil_kwargs=PNG_PIL_KWARGS,
+        )
         buf.seek(0)
         return buf